@@ -4,10 +4,11 @@
 """Interface used by provider and requirer of the 5G UDM."""
 
 import logging
-from typing import Optional
+from typing import Dict, Mapping, NamedTuple, Optional
 
 from ops.charm import CharmBase, CharmEvents, RelationChangedEvent
 from ops.framework import EventBase, EventSource, Handle, Object
+from ops.model import Relation
 
 # The unique Charmhub library identifier, never change it
 LIBID = "431fe7c4892f4fce82303e14cc40764f"
@@ -17,11 +18,31 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 2
+LIBPATCH = 3
 
 
 logger = logging.getLogger(__name__)
 
+UDM_IPV4_ADDRESS_KEY = "udm_ipv4_address"
+UDM_FQDN_KEY = "udm_fqdn"
+UDM_PORT_KEY = "udm_port"
+UDM_API_VERSION_KEY = "udm_api_version"
+REQUIRED_UDM_INFORMATION_KEYS = (
+    UDM_IPV4_ADDRESS_KEY,
+    UDM_FQDN_KEY,
+    UDM_PORT_KEY,
+    UDM_API_VERSION_KEY,
+)
+
+
+class UDMInfo(NamedTuple):
+    """UDM information shared over the fiveg-udm relation."""
+
+    ipv4_address: str
+    fqdn: str
+    port: str
+    api_version: str
+
 
 class UDMAvailableEvent(EventBase):
     """Charm event emitted when an UDM is available."""
@@ -36,26 +57,50 @@ class UDMAvailableEvent(EventBase):
     ):
         """Init."""
         super().__init__(handle)
-        self.udm_ipv4_address = udm_ipv4_address
-        self.udm_fqdn = udm_fqdn
-        self.udm_port = udm_port
-        self.udm_api_version = udm_api_version
+        self.udm_info = UDMInfo(
+            ipv4_address=udm_ipv4_address,
+            fqdn=udm_fqdn,
+            port=udm_port,
+            api_version=udm_api_version,
+        )
+
+    @property
+    def udm_ipv4_address(self) -> str:
+        """Returns UDM IPv4 address."""
+        return self.udm_info.ipv4_address
+
+    @property
+    def udm_fqdn(self) -> str:
+        """Returns UDM FQDN."""
+        return self.udm_info.fqdn
+
+    @property
+    def udm_port(self) -> str:
+        """Returns UDM port."""
+        return self.udm_info.port
+
+    @property
+    def udm_api_version(self) -> str:
+        """Returns UDM API version."""
+        return self.udm_info.api_version
 
     def snapshot(self) -> dict:
         """Returns snapshot."""
         return {
-            "udm_ipv4_address": self.udm_ipv4_address,
-            "udm_fqdn": self.udm_fqdn,
-            "udm_port": self.udm_port,
-            "udm_api_version": self.udm_api_version,
+            UDM_IPV4_ADDRESS_KEY: self.udm_info.ipv4_address,
+            UDM_FQDN_KEY: self.udm_info.fqdn,
+            UDM_PORT_KEY: self.udm_info.port,
+            UDM_API_VERSION_KEY: self.udm_info.api_version,
         }
 
     def restore(self, snapshot: dict) -> None:
         """Restores snapshot."""
-        self.udm_ipv4_address = snapshot["udm_ipv4_address"]
-        self.udm_fqdn = snapshot["udm_fqdn"]
-        self.udm_port = snapshot["udm_port"]
-        self.udm_api_version = snapshot["udm_api_version"]
+        self.udm_info = UDMInfo(
+            ipv4_address=snapshot[UDM_IPV4_ADDRESS_KEY],
+            fqdn=snapshot[UDM_FQDN_KEY],
+            port=snapshot[UDM_PORT_KEY],
+            api_version=snapshot[UDM_API_VERSION_KEY],
+        )
 
 
 class FiveGUDMRequirerCharmEvents(CharmEvents):
@@ -92,94 +137,103 @@ class FiveGUDMRequires(Object):
             logger.warning("No remote application in relation: %s", self.relationship_name)
             return
         remote_app_relation_data = relation.data[relation.app]
-        if "udm_ipv4_address" not in remote_app_relation_data:
+        missing_keys = [
+            key for key in REQUIRED_UDM_INFORMATION_KEYS if key not in remote_app_relation_data
+        ]
+        if missing_keys:
             logger.info(
-                "No udm_ipv4_address in relation data - Not triggering udm_available event"
+                "No %s in relation data - Not triggering udm_available event",
+                ", ".join(missing_keys),
             )
             return
-        if "udm_fqdn" not in remote_app_relation_data:
-            logger.info("No udm_fqdn in relation data - Not triggering udm_available event")
-            return
-        if "udm_port" not in remote_app_relation_data:
-            logger.info("No udm_port in relation data - Not triggering udm_available event")
-            return
-        if "udm_api_version" not in remote_app_relation_data:
-            logger.info("No udm_api_version in relation data - Not triggering udm_available event")
-            return
         self.on.udm_available.emit(
-            udm_ipv4_address=remote_app_relation_data["udm_ipv4_address"],
-            udm_fqdn=remote_app_relation_data["udm_fqdn"],
-            udm_port=remote_app_relation_data["udm_port"],
-            udm_api_version=remote_app_relation_data["udm_api_version"],
+            **{key: remote_app_relation_data[key] for key in REQUIRED_UDM_INFORMATION_KEYS}
         )
 
+    def _remote_app_data(self) -> Optional[Mapping[str, str]]:
+        """Returns the remote application's relation data.
+
+        Relation objects and their data bags are cached by the ops model for the duration of
+        the hook, so a single lookup serves every property reading from the same relation.
+
+        Returns:
+            Mapping[str, str]: Remote application relation data, None if not available.
+        """
+        relation = self.model.get_relation(relation_name=self.relationship_name)
+        if not relation or not relation.app:
+            return None
+        return relation.data.get(relation.app)
+
+    def get_udm_info(self) -> Optional[UDMInfo]:
+        """Returns all UDM information from relation data with a single relation lookup.
+
+        Returns:
+            UDMInfo: UDM information, None if any of it is missing.
+        """
+        remote_app_relation_data = self._remote_app_data()
+        if not remote_app_relation_data:
+            return None
+        try:
+            return UDMInfo(
+                ipv4_address=remote_app_relation_data[UDM_IPV4_ADDRESS_KEY],
+                fqdn=remote_app_relation_data[UDM_FQDN_KEY],
+                port=remote_app_relation_data[UDM_PORT_KEY],
+                api_version=remote_app_relation_data[UDM_API_VERSION_KEY],
+            )
+        except KeyError:
+            return None
+
     @property
     def udm_ipv4_address_available(self) -> bool:
         """Returns whether udm address is available in relation data."""
-        if self.udm_ipv4_address:
-            return True
-        else:
-            return False
+        return bool(self.udm_ipv4_address)
 
     @property
     def udm_ipv4_address(self) -> Optional[str]:
         """Returns udm_ipv4_address from relation data."""
-        relation = self.model.get_relation(relation_name=self.relationship_name)
-        remote_app_relation_data = relation.data.get(relation.app)
+        remote_app_relation_data = self._remote_app_data()
         if not remote_app_relation_data:
             return None
-        return remote_app_relation_data.get("udm_ipv4_address", None)
+        return remote_app_relation_data.get(UDM_IPV4_ADDRESS_KEY, None)
 
     @property
     def udm_fqdn_available(self) -> bool:
         """Returns whether udm fqdn is available in relation data."""
-        if self.udm_fqdn:
-            return True
-        else:
-            return False
+        return bool(self.udm_fqdn)
 
     @property
     def udm_fqdn(self) -> Optional[str]:
         """Returns udm_fqdn from relation data."""
-        relation = self.model.get_relation(relation_name=self.relationship_name)
-        remote_app_relation_data = relation.data.get(relation.app)
+        remote_app_relation_data = self._remote_app_data()
         if not remote_app_relation_data:
             return None
-        return remote_app_relation_data.get("udm_fqdn", None)
+        return remote_app_relation_data.get(UDM_FQDN_KEY, None)
 
     @property
     def udm_port_available(self) -> bool:
         """Returns whether udm port is available in relation data."""
-        if self.udm_port:
-            return True
-        else:
-            return False
+        return bool(self.udm_port)
 
     @property
     def udm_port(self) -> Optional[str]:
         """Returns udm_port from relation data."""
-        relation = self.model.get_relation(relation_name=self.relationship_name)
-        remote_app_relation_data = relation.data.get(relation.app)
+        remote_app_relation_data = self._remote_app_data()
         if not remote_app_relation_data:
             return None
-        return remote_app_relation_data.get("udm_port", None)
+        return remote_app_relation_data.get(UDM_PORT_KEY, None)
 
     @property
     def udm_api_version_available(self) -> bool:
         """Returns whether udm api version is available in relation data."""
-        if self.udm_api_version:
-            return True
-        else:
-            return False
+        return bool(self.udm_api_version)
 
     @property
     def udm_api_version(self) -> Optional[str]:
         """Returns udm_api_version from relation data."""
-        relation = self.model.get_relation(relation_name=self.relationship_name)
-        remote_app_relation_data = relation.data.get(relation.app)
+        remote_app_relation_data = self._remote_app_data()
         if not remote_app_relation_data:
             return None
-        return remote_app_relation_data.get("udm_api_version", None)
+        return remote_app_relation_data.get(UDM_API_VERSION_KEY, None)
 
 
 class FiveGUDMProvides(Object):
@@ -214,21 +268,14 @@ class FiveGUDMProvides(Object):
         relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
         if not relation:
             raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
-        if self.udm_data_is_set(
-            relation_id=relation_id,
-            udm_ipv4_address=udm_ipv4_address,
-            udm_fqdn=udm_fqdn,
-            udm_port=udm_port,
-            udm_api_version=udm_api_version,
-        ):
-            return
-        relation.data[self.charm.app].update(
-            {
-                "udm_ipv4_address": udm_ipv4_address,
-                "udm_fqdn": udm_fqdn,
-                "udm_port": udm_port,
-                "udm_api_version": udm_api_version,
-            }
+        self._set_udm_information_in_relation(
+            relation=relation,
+            udm_information={
+                UDM_IPV4_ADDRESS_KEY: udm_ipv4_address,
+                UDM_FQDN_KEY: udm_fqdn,
+                UDM_PORT_KEY: udm_port,
+                UDM_API_VERSION_KEY: udm_api_version,
+            },
         )
 
     def udm_data_is_set(
@@ -243,16 +290,16 @@ class FiveGUDMProvides(Object):
         relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
         if not relation:
             raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
-        if relation.data[self.charm.app].get("udm_ipv4_address", None) != udm_ipv4_address:
+        if relation.data[self.charm.app].get(UDM_IPV4_ADDRESS_KEY, None) != udm_ipv4_address:
             logger.info(f"udm_ipv4_address not set to {udm_ipv4_address} in relation data")
             return False
-        if relation.data[self.charm.app].get("udm_fqdn", None) != udm_fqdn:
+        if relation.data[self.charm.app].get(UDM_FQDN_KEY, None) != udm_fqdn:
             logger.info(f"udm_fqdn not set to {udm_fqdn} in relation data")
             return False
-        if relation.data[self.charm.app].get("udm_port", None) != udm_port:
+        if relation.data[self.charm.app].get(UDM_PORT_KEY, None) != udm_port:
             logger.info(f"udm_port not set to {udm_port} in relation data")
             return False
-        if relation.data[self.charm.app].get("udm_api_version", None) != udm_api_version:
+        if relation.data[self.charm.app].get(UDM_API_VERSION_KEY, None) != udm_api_version:
             logger.info(f"udm_api_version not set to {udm_api_version} in relation data")
             return False
         return True
@@ -260,13 +307,33 @@ class FiveGUDMProvides(Object):
     def set_udm_information_for_all_relations(
         self, udm_ipv4_address: str, udm_fqdn: str, udm_port: str, udm_api_version: str
     ) -> None:
-        """Sets UDR information in relation data for all relations."""
-        relations = self.model.relations
-        for relation in relations[self.relationship_name]:
-            self.set_udm_information(
-                udm_ipv4_address=udm_ipv4_address,
-                udm_fqdn=udm_fqdn,
-                udm_port=udm_port,
-                udm_api_version=udm_api_version,
-                relation_id=relation.id,
+        """Sets UDM information in relation data for all relations."""
+        udm_information = {
+            UDM_IPV4_ADDRESS_KEY: udm_ipv4_address,
+            UDM_FQDN_KEY: udm_fqdn,
+            UDM_PORT_KEY: udm_port,
+            UDM_API_VERSION_KEY: udm_api_version,
+        }
+        for relation in self.model.relations[self.relationship_name]:
+            self._set_udm_information_in_relation(
+                relation=relation, udm_information=udm_information
             )
+
+    def _set_udm_information_in_relation(
+        self, relation: Relation, udm_information: Dict[str, str]
+    ) -> None:
+        """Writes the UDM information that differs from what is set in the given relation.
+
+        Only changed keys are written so that unchanged values don't reach Juju.
+
+        Args:
+            relation: Relation to write to
+            udm_information: UDM information keyed by relation data key
+
+        Returns:
+            None
+        """
+        relation_data = relation.data[self.charm.app]
+        for key, value in udm_information.items():
+            if relation_data.get(key) != value:
+                relation_data[key] = value
@@ -4,8 +4,9 @@
 
 """Charmed Operator for the OpenAirInterface 5G Core UDM component."""
 
-
 import logging
+from functools import cached_property
+from typing import TYPE_CHECKING, Optional
 
 from charms.oai_5g_nrf.v0.fiveg_nrf import FiveGNRFRequires  # type: ignore[import]
 from charms.oai_5g_udm.v0.oai_5g_udm import FiveGUDMProvides  # type: ignore[import]
@@ -14,15 +15,36 @@ from charms.observability_libs.v1.kubernetes_service_patch import (  # type: ign
     KubernetesServicePatch,
     ServicePort,
 )
-from jinja2 import Environment, FileSystemLoader
 from ops.charm import CharmBase, ConfigChangedEvent
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, ModelError, WaitingStatus
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.pebble import APIError as PebbleAPIError
+from ops.pebble import ConnectionError as PebbleConnectionError
+from ops.pebble import Layer
+
+if TYPE_CHECKING:
+    from jinja2 import Template
 
 logger = logging.getLogger(__name__)
 
 BASE_CONFIG_PATH = "/openair-udm/etc"
 CONFIG_FILE_NAME = "udm.conf"
+# Where compiled templates are cached between hooks, None uses jinja2's per-user temp directory.
+# Only overridden by the unit tests, to keep the cache in a per-run directory.
+TEMPLATE_BYTECODE_CACHE_DIRECTORY: Optional[str] = None
+SBI_INTERFACE_PORT = 80
+SBI_INTERFACE_HTTP2_PORT = 9090
+SERVICE_PORTS = [
+    ServicePort(
+        name="http1", port=SBI_INTERFACE_PORT, protocol="TCP", targetPort=SBI_INTERFACE_PORT
+    ),
+    ServicePort(
+        name="http2",
+        port=SBI_INTERFACE_HTTP2_PORT,
+        protocol="TCP",
+        targetPort=SBI_INTERFACE_HTTP2_PORT,
+    ),
+]
 
 
 class Oai5GUDMOperatorCharm(CharmBase):
@@ -33,23 +55,7 @@ class Oai5GUDMOperatorCharm(CharmBase):
         super().__init__(*args)
         self._container_name = self._service_name = "udm"
         self._container = self.unit.get_container(self._container_name)
-        self.service_patcher = KubernetesServicePatch(
-            charm=self,
-            ports=[
-                ServicePort(
-                    name="http1",
-                    port=int(self._config_sbi_interface_port),
-                    protocol="TCP",
-                    targetPort=int(self._config_sbi_interface_port),
-                ),
-                ServicePort(
-                    name="http2",
-                    port=int(self._config_sbi_interface_http2_port),
-                    protocol="TCP",
-                    targetPort=int(self._config_sbi_interface_http2_port),
-                ),
-            ],
-        )
+        self.service_patcher = KubernetesServicePatch(charm=self, ports=SERVICE_PORTS)
         self.nrf_requires = FiveGNRFRequires(self, "fiveg-nrf")
         self.udr_requires = FiveGUDRRequires(self, "fiveg-udr")
         self.udm_provides = FiveGUDMProvides(self, "fiveg-udm")
@@ -74,7 +80,7 @@ class Oai5GUDMOperatorCharm(CharmBase):
             return
         self.udm_provides.set_udm_information(
             udm_ipv4_address="127.0.0.1",
-            udm_fqdn=f"{self.model.app.name}.{self.model.name}.svc.cluster.local",
+            udm_fqdn=self._udm_fqdn,
             udm_port=self._config_sbi_interface_port,
             udm_api_version=self._config_sbi_interface_api_version,
             relation_id=event.relation.id,
@@ -82,18 +88,17 @@ class Oai5GUDMOperatorCharm(CharmBase):
 
     @property
     def _udm_service_started(self) -> bool:
-        if not self._container.can_connect():
-            return False
         try:
-            service = self._container.get_service(self._service_name)
-        except ModelError:
+            services = self._container.get_services(self._service_name)
+        except (PebbleConnectionError, PebbleAPIError, FileNotFoundError):
             return False
-        if not service.is_running():
+        service = services.get(self._service_name)
+        if not service or not service.is_running():
             return False
         return True
 
     def _on_config_changed(self, event: ConfigChangedEvent) -> None:
-        """Triggered on any change in configuration.
+        """Triggered on any change in configuration or in NRF/UDR relation data.
 
         Args:
             event: Config Changed Event
@@ -119,29 +124,62 @@ class Oai5GUDMOperatorCharm(CharmBase):
         if not self.udr_requires.udr_ipv4_address_available:
             self.unit.status = WaitingStatus("Waiting for UDR IPv4 address to be available")
             return
-        self._push_config()
-        self._update_pebble_layer()
+        self._reconcile()
         if self.unit.is_leader():
             self._set_udm_information_for_all_relations()
         self.unit.status = ActiveStatus()
 
+    def _reconcile(self) -> None:
+        """Brings the workload in line with the current configuration and relation data.
+
+        Safe to call on every event: the config file is only pushed, and the service only
+        restarted, when their content changed.
+
+        Returns:
+            None
+        """
+        content = self._render_config_file()
+        config_file_changed = not self._config_file_content_matches(content)
+        if config_file_changed:
+            self._write_config_file(content)
+        else:
+            logger.info(f"Config file is up to date: {CONFIG_FILE_NAME}")
+        self._update_pebble_layer(restart=config_file_changed)
+
     def _set_udm_information_for_all_relations(self):
         self.udm_provides.set_udm_information_for_all_relations(
             udm_ipv4_address="127.0.0.1",
-            udm_fqdn=f"{self.model.app.name}.{self.model.name}.svc.cluster.local",
+            udm_fqdn=self._udm_fqdn,
             udm_port=self._config_sbi_interface_port,
             udm_api_version=self._config_sbi_interface_api_version,
         )
 
-    def _update_pebble_layer(self) -> None:
+    def _update_pebble_layer(self, restart: bool) -> None:
         """Updates pebble layer with new configuration.
 
+        The layer is only added and replanned when the UDM service definition differs from the
+        one in the current plan, in which case the replan restarts the service. Otherwise the
+        service is restarted if asked, or started if it is not running.
+
+        Args:
+            restart: Whether the service needs a restart to pick up a new config file
+
         Returns:
             None
         """
-        self._container.add_layer("udm", self._pebble_layer, combine=True)
-        self._container.replan()
-        self._container.restart(self._service_name)
+        current_service = self._container.get_plan().services.get(self._service_name)
+        desired_service = self._pebble_layer.services[self._service_name]
+        if current_service is None or current_service != desired_service:
+            self._container.add_layer("udm", self._pebble_layer, combine=True)
+            self._container.replan()
+            logger.info("Pebble layer updated")
+            return
+        if restart:
+            self._container.restart(self._service_name)
+            logger.info(f"Restarted service: {self._service_name}")
+        elif not self._udm_service_started:
+            self._container.start(self._service_name)
+            logger.info(f"Started service: {self._service_name}")
 
     @property
     def _nrf_relation_created(self) -> bool:
@@ -156,10 +194,37 @@ class Oai5GUDMOperatorCharm(CharmBase):
             return False
         return True
 
-    def _push_config(self) -> None:
-        jinja2_environment = Environment(loader=FileSystemLoader("src/templates/"))
-        template = jinja2_environment.get_template(f"{CONFIG_FILE_NAME}.j2")
-        content = template.render(
+    @cached_property
+    def _config_file_template(self) -> "Template":
+        """Returns the compiled config file template, loaded once per charm instance.
+
+        jinja2 is imported here so that hooks which never render the config file don't pay
+        for importing it. Each hook runs in a new process, so the compiled template is kept in
+        a bytecode cache on disk, letting later hooks skip parsing and compiling it again. The
+        cache is only an optimization: if it can't be created or written to, the template is
+        compiled in memory instead.
+        """
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        loader = FileSystemLoader("src/templates/")
+        try:
+            bytecode_cache = FileSystemBytecodeCache(directory=TEMPLATE_BYTECODE_CACHE_DIRECTORY)
+            jinja2_environment = Environment(
+                loader=loader, bytecode_cache=bytecode_cache, auto_reload=False
+            )
+            return jinja2_environment.get_template(f"{CONFIG_FILE_NAME}.j2")
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Template bytecode cache is unavailable, not using it: {e}")
+        jinja2_environment = Environment(loader=loader, auto_reload=False)
+        return jinja2_environment.get_template(f"{CONFIG_FILE_NAME}.j2")
+
+    def _render_config_file(self) -> str:
+        """Renders the config file from the charm's configuration and relation data.
+
+        Returns:
+            str: Config file content.
+        """
+        return self._config_file_template.render(
             instance=self._config_instance,
             pid_directory=self._config_pid_directory,
             udm_name=self._config_udm_name,
@@ -178,9 +243,27 @@ class Oai5GUDMOperatorCharm(CharmBase):
             nrf_fqdn=self.nrf_requires.nrf_fqdn,
         )
 
+    def _write_config_file(self, content: str) -> None:
+        """Writes the config file to the workload container.
+
+        Callers must have checked that Pebble is reachable.
+
+        Args:
+            content: Config file content
+
+        Returns:
+            None
+        """
         self._container.push(path=f"{BASE_CONFIG_PATH}/{CONFIG_FILE_NAME}", source=content)
         logger.info(f"Wrote file to container: {CONFIG_FILE_NAME}")
 
+    def _config_file_content_matches(self, content: str) -> bool:
+        """Returns whether the config file in the workload container has the given content."""
+        if not self._config_file_is_pushed:
+            return False
+        existing_content = self._container.pull(f"{BASE_CONFIG_PATH}/{CONFIG_FILE_NAME}")
+        return existing_content.read() == content
+
     @property
     def _config_file_is_pushed(self) -> bool:
         """Check if config file is pushed to the container."""
@@ -190,61 +273,67 @@ class Oai5GUDMOperatorCharm(CharmBase):
         logger.info("Config file is pushed")
         return True
 
-    @property
+    @cached_property
+    def _udm_fqdn(self) -> str:
+        return f"{self.model.app.name}.{self.model.name}.svc.cluster.local"
+
+    @cached_property
     def _config_instance(self) -> str:
         return "0"
 
-    @property
+    @cached_property
     def _config_pid_directory(self) -> str:
         return "/var/run"
 
-    @property
+    @cached_property
     def _config_udm_name(self) -> str:
         return "OAI_UDM"
 
-    @property
+    @cached_property
     def _config_use_fqdn_dns(self) -> str:
         return "yes"
 
-    @property
+    @cached_property
     def _config_register_nrf(self) -> str:
         return "no"
 
-    @property
+    @cached_property
     def _config_use_http2(self) -> str:
         return "no"
 
-    @property
+    @cached_property
     def _config_sbi_interface_name(self) -> str:
         return "eth0"
 
-    @property
+    @cached_property
     def _config_sbi_interface_port(self) -> str:
-        return "80"
+        return str(SBI_INTERFACE_PORT)
 
-    @property
+    @cached_property
     def _config_sbi_interface_http2_port(self) -> str:
-        return "9090"
+        return str(SBI_INTERFACE_HTTP2_PORT)
 
-    @property
+    @cached_property
     def _config_sbi_interface_api_version(self) -> str:
         return "v1"
 
-    @property
-    def _pebble_layer(self) -> dict:
-        """Return a dictionary representing a Pebble layer."""
-        return {
-            "summary": "udm layer",
-            "description": "pebble config layer for udm",
-            "services": {
-                self._service_name: {
-                    "override": "replace",
-                    "summary": "udm",
-                    "command": f"/openair-udm/bin/oai_udm -c {BASE_CONFIG_PATH}/{CONFIG_FILE_NAME} -o",  # noqa: E501
-                    "startup": "enabled",
-                }
-            },
-        }
+    @cached_property
+    def _pebble_layer(self) -> Layer:
+        """Return the Pebble layer for the UDM service."""
+        return Layer(
+            {
+                "summary": "udm layer",
+                "description": "pebble config layer for udm",
+                "services": {
+                    self._service_name: {
+                        "override": "replace",
+                        "summary": "udm",
+                        "command": f"/openair-udm/bin/oai_udm -c {BASE_CONFIG_PATH}/{CONFIG_FILE_NAME} -o",  # noqa: E501
+                        "startup": "enabled",
+                    }
+                },
+            }
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+from unittest.mock import patch
+
+import ops.testing
+import pytest
+from ops.pebble import ServiceInfo, ServiceStartup, ServiceStatus
+from ops.testing import Harness
+
+from charm import Oai5GUDMOperatorCharm
+
+MODEL_NAME = "whatever"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def kubernetes_service_patch():
+    with patch("charm.KubernetesServicePatch", lambda charm, ports: None):
+        yield
+
+
+@pytest.fixture(scope="session", autouse=True)
+def template_bytecode_cache_directory(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("jinja2-cache")
+    with patch("charm.TEMPLATE_BYTECODE_CACHE_DIRECTORY", str(directory)):
+        yield directory
+
+
+@pytest.fixture(scope="session", autouse=True)
+def simulate_can_connect():
+    simulate_can_connect = ops.testing.SIMULATE_CAN_CONNECT
+    ops.testing.SIMULATE_CAN_CONNECT = True
+    yield
+    ops.testing.SIMULATE_CAN_CONNECT = simulate_can_connect
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(Oai5GUDMOperatorCharm)
+    harness.set_model_name(name=MODEL_NAME)
+    harness.begin()
+    harness.set_can_connect(container="udm", val=True)
+    yield harness
+    harness.cleanup()
+
+
+@pytest.fixture
+def leader_active_harness(harness):
+    harness.set_leader(True)
+    with patch("ops.model.Container.get_services") as patch_get_services:
+        patch_get_services.return_value = {
+            "udm": ServiceInfo(
+                name="udm",
+                current=ServiceStatus.ACTIVE,
+                startup=ServiceStartup.ENABLED,
+            )
+        }
+        yield harness
+
+
+@pytest.fixture
+def mock_push():
+    with patch("ops.model.Container.push") as mock_push:
+        yield mock_push
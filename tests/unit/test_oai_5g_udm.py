@@ -0,0 +1,221 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import logging
+from unittest.mock import patch
+
+import pytest
+from charms.oai_5g_udm.v0.oai_5g_udm import FiveGUDMProvides, FiveGUDMRequires, UDMInfo
+from ops.charm import CharmBase
+from ops.model import RelationDataContent
+from ops.testing import Harness
+
+REQUIRER_METADATA = """
+name: udm-requirer
+requires:
+  fiveg-udm:
+    interface: fiveg-udm
+"""
+
+PROVIDER_METADATA = """
+name: udm-provider
+provides:
+  fiveg-udm:
+    interface: fiveg-udm
+"""
+
+UDM_RELATION_DATA = {
+    "udm_ipv4_address": "1.2.3.4",
+    "udm_fqdn": "udm.example.com",
+    "udm_port": "80",
+    "udm_api_version": "v1",
+}
+
+
+class UDMRequirerCharm(CharmBase):
+    def __init__(self, *args):
+        """Observes udm_available events."""
+        super().__init__(*args)
+        self.udm_requires = FiveGUDMRequires(self, "fiveg-udm")
+        self.defer_udm_available = False
+        self.udm_available_events = []
+        self.framework.observe(self.udm_requires.on.udm_available, self._on_udm_available)
+
+    def _on_udm_available(self, event):
+        self.udm_available_events.append(event)
+        if self.defer_udm_available:
+            event.defer()
+
+
+class UDMProviderCharm(CharmBase):
+    def __init__(self, *args):
+        """Instantiates the UDM provider."""
+        super().__init__(*args)
+        self.udm_provides = FiveGUDMProvides(self, "fiveg-udm")
+
+
+@pytest.fixture
+def requirer_harness():
+    harness = Harness(UDMRequirerCharm, meta=REQUIRER_METADATA)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+@pytest.fixture
+def provider_harness():
+    harness = Harness(UDMProviderCharm, meta=PROVIDER_METADATA)
+    harness.set_leader(True)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+def create_udm_relation(harness, key_values):
+    relation_id = harness.add_relation("fiveg-udm", "udm")
+    harness.add_relation_unit(relation_id=relation_id, remote_unit_name="udm/0")
+    harness.update_relation_data(relation_id=relation_id, app_or_unit="udm", key_values=key_values)
+    return relation_id
+
+
+def test_given_udm_relation_contains_all_udm_information_when_get_udm_info_then_udm_info_is_returned(  # noqa: E501
+    requirer_harness,
+):
+    create_udm_relation(requirer_harness, UDM_RELATION_DATA)
+
+    udm_info = requirer_harness.charm.udm_requires.get_udm_info()
+
+    assert udm_info == UDMInfo(
+        ipv4_address="1.2.3.4",
+        fqdn="udm.example.com",
+        port="80",
+        api_version="v1",
+    )
+
+
+@pytest.mark.parametrize("missing_key", sorted(UDM_RELATION_DATA))
+def test_given_udm_relation_misses_one_key_when_get_udm_info_then_none_is_returned(
+    requirer_harness, missing_key
+):
+    key_values = {key: value for key, value in UDM_RELATION_DATA.items() if key != missing_key}
+    create_udm_relation(requirer_harness, key_values)
+
+    assert requirer_harness.charm.udm_requires.get_udm_info() is None
+
+
+def test_given_no_udm_relation_when_get_udm_info_then_none_is_returned(requirer_harness):
+    assert requirer_harness.charm.udm_requires.get_udm_info() is None
+
+
+def test_given_no_udm_relation_when_udm_properties_are_read_then_none_is_returned(
+    requirer_harness,
+):
+    udm_requires = requirer_harness.charm.udm_requires
+
+    assert udm_requires.udm_ipv4_address is None
+    assert udm_requires.udm_fqdn is None
+    assert udm_requires.udm_port is None
+    assert udm_requires.udm_api_version is None
+    assert not udm_requires.udm_ipv4_address_available
+
+
+def test_given_udm_relation_misses_one_key_when_relation_changed_then_udm_available_is_not_emitted(  # noqa: E501
+    requirer_harness, caplog
+):
+    key_values = {key: value for key, value in UDM_RELATION_DATA.items() if key != "udm_port"}
+
+    with caplog.at_level(logging.INFO):
+        create_udm_relation(requirer_harness, key_values)
+
+    assert requirer_harness.charm.udm_available_events == []
+    assert "No udm_port in relation data - Not triggering udm_available event" in caplog.text
+
+
+def test_given_udm_available_event_is_deferred_when_reemitted_then_udm_information_is_restored(
+    requirer_harness,
+):
+    requirer_harness.charm.defer_udm_available = True
+    create_udm_relation(requirer_harness, UDM_RELATION_DATA)
+    requirer_harness.charm.defer_udm_available = False
+
+    requirer_harness.framework.reemit()
+
+    deferred_event, restored_event = requirer_harness.charm.udm_available_events
+    assert restored_event is not deferred_event
+    assert restored_event.udm_info == UDMInfo(
+        ipv4_address="1.2.3.4",
+        fqdn="udm.example.com",
+        port="80",
+        api_version="v1",
+    )
+    assert restored_event.udm_ipv4_address == "1.2.3.4"
+    assert restored_event.udm_fqdn == "udm.example.com"
+    assert restored_event.udm_port == "80"
+    assert restored_event.udm_api_version == "v1"
+
+
+def test_given_udm_information_is_set_when_one_value_changes_then_only_that_key_is_written(
+    provider_harness,
+):
+    relation_id = provider_harness.add_relation("fiveg-udm", "ausf")
+    udm_provides = provider_harness.charm.udm_provides
+    udm_provides.set_udm_information(
+        udm_ipv4_address="1.2.3.4",
+        udm_fqdn="udm.example.com",
+        udm_port="80",
+        udm_api_version="v1",
+        relation_id=relation_id,
+    )
+
+    with patch.object(
+        RelationDataContent,
+        "__setitem__",
+        autospec=True,
+        side_effect=RelationDataContent.__setitem__,
+    ) as patch_setitem:
+        udm_provides.set_udm_information(
+            udm_ipv4_address="1.2.3.4",
+            udm_fqdn="udm.example.com",
+            udm_port="8080",
+            udm_api_version="v1",
+            relation_id=relation_id,
+        )
+
+    assert [call.args[1:] for call in patch_setitem.call_args_list] == [("udm_port", "8080")]
+    assert provider_harness.get_relation_data(
+        relation_id=relation_id, app_or_unit=provider_harness.model.app.name
+    ) == {
+        "udm_ipv4_address": "1.2.3.4",
+        "udm_fqdn": "udm.example.com",
+        "udm_port": "8080",
+        "udm_api_version": "v1",
+    }
+
+
+def test_given_udm_information_is_set_when_set_again_with_same_values_then_nothing_is_written(
+    provider_harness,
+):
+    relation_id = provider_harness.add_relation("fiveg-udm", "ausf")
+    udm_provides = provider_harness.charm.udm_provides
+    udm_provides.set_udm_information_for_all_relations(
+        udm_ipv4_address="1.2.3.4",
+        udm_fqdn="udm.example.com",
+        udm_port="80",
+        udm_api_version="v1",
+    )
+
+    with patch.object(RelationDataContent, "__setitem__") as patch_setitem:
+        udm_provides.set_udm_information_for_all_relations(
+            udm_ipv4_address="1.2.3.4",
+            udm_fqdn="udm.example.com",
+            udm_port="80",
+            udm_api_version="v1",
+        )
+
+    patch_setitem.assert_not_called()
+    assert (
+        provider_harness.get_relation_data(
+            relation_id=relation_id, app_or_unit=provider_harness.model.app.name
+        )
+        == UDM_RELATION_DATA
+    )